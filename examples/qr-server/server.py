@@ -3,28 +3,61 @@
 # requires-python = ">=3.10"
 # dependencies = [
 #     "mcp>=1.26.0",
-#     "qrcode[pil]>=8.0",
-#     "uvicorn>=0.34.0",
+#     "segno>=1.6.0",
+#     "pillow>=10.0.0",
+#     "numpy>=1.26.0",
+#     "pybase64>=1.4.0",
+#     "uvicorn[standard]>=0.34.0",
 #     "starlette>=0.46.0",
 # ]
 # ///
 """
 QR Code MCP Server - Generates QR codes from text
 """
+import asyncio
+import hashlib
 import os
 import sys
-import io
-import base64
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from pathlib import Path
 
-import qrcode
+import numpy as np
+import pybase64
+import segno
 import uvicorn
+from PIL import ImageColor
 from mcp.server.fastmcp import FastMCP
 from mcp import types
 from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import HTMLResponse, JSONResponse, PlainTextResponse, Response
 
 VIEW_URI = "ui://qr-server/view.html"
 HOST = os.environ.get("HOST", "0.0.0.0")  # 0.0.0.0 for Docker compatibility
 PORT = int(os.environ.get("PORT", "3001"))
+# Number of uvicorn worker processes in HTTP mode
+WORKERS = int(os.environ.get("WORKERS", "1"))
+# Number of processes rendering QR codes (CPU-bound) off the event loop, per
+# uvicorn worker (each worker starts its own pool): the CPUs are split between them
+QR_PROCESSES = int(os.environ.get("QR_PROCESSES", str(max(1, (os.cpu_count() or 1) // WORKERS))))
+# Max number of rendered QR codes (PNGs) kept in memory
+CACHE_SIZE = int(os.environ.get("CACHE_SIZE", "1024"))
+# Max number of (text, error_correction) QR matrices kept in memory
+QR_CACHE_SIZE = int(os.environ.get("QR_CACHE_SIZE", "512"))
+# zlib level for PNG output: QR codes compress well even at the fastest level
+PNG_COMPRESS_LEVEL = int(os.environ.get("PNG_COMPRESS_LEVEL", "1"))
+# Accepted box_size / border ranges (pixels per module / modules): larger values
+# only waste memory (and can get a render process OOM-killed)
+MAX_BOX_SIZE = 100
+MAX_BORDER = 100
+# Start and warm up render processes before the first request (lazy imports,
+# first-call costs, and the default QR code in the render cache)
+WARMUP = os.environ.get("WARMUP", "1") == "1"
 
 mcp = FastMCP("QR Code Server", stateless_http=True)
 
@@ -99,11 +132,177 @@ EMBEDDED_VIEW_HTML = """<!DOCTYPE html>
 </html>"""
 
 
+# Supported error correction levels: L(7%), M(15%), Q(25%), H(30%), keyed by
+# the raw (upper or lower case) input so normalizing is a single lookup
+_ERROR_LEVELS = {
+    "L": "L", "l": "L",
+    "M": "M", "m": "M",
+    "Q": "Q", "q": "Q",
+    "H": "H", "h": "H",
+}
+
+# Render processes, started on first use (they import this module too)
+_executor: ProcessPoolExecutor | None = None
+
+
+@lru_cache(maxsize=QR_CACHE_SIZE)
+def _build_matrix(text: str, ec_level: str) -> np.ndarray:
+    """Encode text into a read-only QR module matrix (no border, 1 = dark).
+
+    This is the expensive part (Reed-Solomon encoding + mask selection), and
+    only depends on the text and error correction level, so it is cached.
+    """
+    # boost_error=False: keep the requested level (segno bumps it by default)
+    qr = segno.make_qr(text, error=ec_level, boost_error=False)
+    matrix = np.array(qr.matrix, dtype=np.uint8)
+    matrix.flags.writeable = False
+    return matrix
+
+
+@lru_cache(maxsize=256)
+def _color(color: str) -> tuple[int, int, int, int]:
+    """Parse a color name, hex string or "transparent" into RGBA (cached)."""
+    if color.lower() == "transparent":
+        return (255, 255, 255, 0)
+    return ImageColor.getcolor(color, "RGBA")
+
+
+def _png_chunk(tag: bytes, data: bytes) -> bytes:
+    crc = zlib.crc32(data, zlib.crc32(tag))
+    return b"".join((struct.pack(">I", len(data)), tag, data, struct.pack(">I", crc)))
+
+
+def _qr_scanlines(matrix: np.ndarray, box_size: int, border: int) -> np.ndarray:
+    """Build the 1-bit PNG scanlines of a QR code, one row per pixel row.
+
+    Each scanline is a filter type byte (0 = None) followed by 8 pixels per
+    byte (1 = fill color). Rows of the same module row are identical, so only
+    one pixel row per module row is expanded and bit-packed, then repeated:
+    the full-resolution 1-byte-per-pixel canvas is never allocated.
+    """
+    n = len(matrix)
+    offset = border * box_size
+    end = offset + n * box_size
+    size = end + offset
+    # Expand each module to box_size pixels horizontally, with the side borders
+    rows = np.zeros((n, size), dtype=np.uint8)
+    rows[:, offset:end].reshape(n, n, box_size)[...] = matrix[:, :, None]
+    packed = np.packbits(rows, axis=1)
+    # Repeat each packed row box_size times; top/bottom borders stay 0 (back)
+    scanlines = np.zeros((size, 1 + packed.shape[1]), dtype=np.uint8)
+    scanlines[offset:end, 1:].reshape(n, box_size, -1)[...] = packed[:, None, :]
+    return scanlines
+
+
+def _png_1bit(
+    scanlines: np.ndarray,
+    width: int,
+    back: tuple[int, int, int, int],
+    fill: tuple[int, int, int, int],
+) -> bytes:
+    """Encode a 2-color (1-bit palette) PNG from prebuilt scanlines.
+
+    QR codes only ever need this one pixel format, so this skips PIL's generic
+    save path (mode dispatch, filter selection, extra copies) entirely.
+    """
+    # bit depth 1, color type 3 (palette), default compression/filter, no interlace
+    header = struct.pack(">IIBBBBB", width, len(scanlines), 1, 3, 0, 0, 0)
+    parts = [
+        b"\x89PNG\r\n\x1a\n",
+        _png_chunk(b"IHDR", header),
+        _png_chunk(b"PLTE", bytes(back[:3] + fill[:3])),
+    ]
+    if back[3] < 255 or fill[3] < 255:
+        # Per-palette-entry alpha (e.g. back_color="transparent")
+        parts.append(_png_chunk(b"tRNS", bytes((back[3], fill[3]))))
+    parts.append(_png_chunk(b"IDAT", zlib.compress(scanlines, PNG_COMPRESS_LEVEL)))
+    parts.append(_png_chunk(b"IEND", b""))
+    # One join, one copy: the result is what gets cached and returned
+    return b"".join(parts)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _generate_qr_png(
+    text: str,
+    box_size: int,
+    border: int,
+    ec_level: str,
+    fill_color: str,
+    back_color: str,
+) -> bytes:
+    """Render a QR code as PNG bytes (cached by all rendering parameters)."""
+    matrix = _build_matrix(text, ec_level)
+    scanlines = _qr_scanlines(matrix, box_size, border)
+    width = (len(matrix) + 2 * border) * box_size
+    # 1-bit palette PNG (vs. 24 bits per RGB pixel)
+    return _png_1bit(scanlines, width, _color(back_color), _color(fill_color))
+
+
+def _warmup() -> None:
+    """Render the default QR code, leaving it in the render cache."""
+    _generate_qr_png("https://modelcontextprotocol.io", 10, 4, "M", "black", "white")
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=QR_PROCESSES,
+            initializer=_warmup if WARMUP else None,
+        )
+    return _executor
+
+
+def _start_render_processes() -> None:
+    """Start all render processes now (each warms up in its initializer)."""
+    executor = _get_executor()
+    for _ in range(QR_PROCESSES):
+        executor.submit(int)
+
+
+def _stop_render_processes() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def _render_qr_png(
+    text: str,
+    box_size: int,
+    border: int,
+    error_correction: str,
+    fill_color: str,
+    back_color: str,
+) -> bytes:
+    """Render a QR code in a worker process, so the event loop keeps serving
+    other requests. Each worker process keeps its own caches."""
+    global _executor
+    if not 1 <= box_size <= MAX_BOX_SIZE:
+        raise ValueError(f"box_size must be between 1 and {MAX_BOX_SIZE}")
+    if not 0 <= border <= MAX_BORDER:
+        raise ValueError(f"border must be between 0 and {MAX_BORDER}")
+    ec_level = _ERROR_LEVELS.get(error_correction, "M")
+    args = (text, box_size, border, ec_level, fill_color, back_color)
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    try:
+        return await loop.run_in_executor(executor, _generate_qr_png, *args)
+    except BrokenProcessPool:
+        # A render process died (e.g. OOM-killed), which breaks the whole pool
+        # for good: replace it (unless a concurrent request already did) and
+        # retry once
+        if _executor is executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+        return await loop.run_in_executor(_get_executor(), _generate_qr_png, *args)
+
+
 @mcp.tool(meta={
     "ui":{"resourceUri": VIEW_URI},
     "ui/resourceUri": VIEW_URI, # legacy support
 })
-def generate_qr(
+async def generate_qr(
     text: str = "https://modelcontextprotocol.io",
     box_size: int = 10,
     border: int = 4,
@@ -115,33 +314,52 @@ def generate_qr(
 
     Args:
         text: The text/URL to encode
-        box_size: Size of each box in pixels (default: 10)
-        border: Border size in boxes (default: 4)
+        box_size: Size of each box in pixels, 1-100 (default: 10)
+        border: Border size in boxes, 0-100 (default: 4)
         error_correction: Error correction level - L(7%), M(15%), Q(25%), H(30%)
         fill_color: Foreground color (hex like #FF0000 or name like red)
-        back_color: Background color (hex like #FFFFFF or name like white)
+        back_color: Background color (hex like #FFFFFF, name like white, or transparent)
     """
-    error_levels = {
-        "L": qrcode.constants.ERROR_CORRECT_L,
-        "M": qrcode.constants.ERROR_CORRECT_M,
-        "Q": qrcode.constants.ERROR_CORRECT_Q,
-        "H": qrcode.constants.ERROR_CORRECT_H,
+    png = await _render_qr_png(text, box_size, border, error_correction, fill_color, back_color)
+    b64 = pybase64.b64encode_as_string(png)
+    # Trusted, known-good fields: skip pydantic validation
+    return [types.ImageContent.model_construct(type="image", data=b64, mimeType="image/png")]
+
+
+@mcp.custom_route("/qr.png", methods=["GET"])
+async def qr_png(request: Request) -> Response:
+    """Serve a QR code as a raw PNG, for plain HTTP clients (no base64/JSON).
+
+    Takes the same parameters as generate_qr, as query string parameters.
+    """
+    params = request.query_params
+    try:
+        png = await _render_qr_png(
+            text=params.get("text", "https://modelcontextprotocol.io"),
+            box_size=int(params.get("box_size", "10")),
+            border=int(params.get("border", "4")),
+            error_correction=params.get("error_correction", "M"),
+            fill_color=params.get("fill_color", "black"),
+            back_color=params.get("back_color", "white"),
+        )
+    except ValueError as e:
+        return PlainTextResponse(str(e), status_code=400)
+    return Response(png, media_type="image/png", headers={"Cache-Control": "public, max-age=86400"})
+
+
+def _cache_stats() -> dict:
+    return {
+        "pid": os.getpid(),
+        "images": _generate_qr_png.cache_info()._asdict(),
+        "matrices": _build_matrix.cache_info()._asdict(),
     }
 
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=error_levels.get(error_correction.upper(), qrcode.constants.ERROR_CORRECT_M),
-        box_size=box_size,
-        border=border,
-    )
-    qr.add_data(text)
-    qr.make(fit=True)
 
-    img = qr.make_image(fill_color=fill_color, back_color=back_color)
-    buffer = io.BytesIO()
-    img.save(buffer, format="PNG")
-    b64 = base64.b64encode(buffer.getvalue()).decode()
-    return [types.ImageContent(type="image", data=b64, mimeType="image/png")]
+@mcp.custom_route("/cache-stats", methods=["GET"])
+async def cache_stats(request: Request) -> JSONResponse:
+    """Report QR cache hits/misses (of whichever render process picks this up)."""
+    stats = await asyncio.get_running_loop().run_in_executor(_get_executor(), _cache_stats)
+    return JSONResponse(stats)
 
 
 # IMPORTANT: all the external domains used by app must be listed
@@ -155,18 +373,66 @@ def view() -> str:
     """View HTML resource with CSP metadata for external dependencies."""
     return EMBEDDED_VIEW_HTML
 
+
+# The View is static: hash it once so HTTP clients can revalidate for free
+VIEW_ETAG = '"' + hashlib.sha256(EMBEDDED_VIEW_HTML.encode()).hexdigest()[:16] + '"'
+
+
+@mcp.custom_route("/view.html", methods=["GET"])
+async def view_html(request: Request) -> Response:
+    """Serve the View over plain HTTP, with an ETag (304 when unchanged)."""
+    headers = {"ETag": VIEW_ETAG, "Cache-Control": "public, max-age=3600"}
+    if request.headers.get("if-none-match") == VIEW_ETAG:
+        return Response(status_code=304, headers=headers)
+    return HTMLResponse(EMBEDDED_VIEW_HTML, headers=headers)
+
+
+def create_app():
+    """Create the ASGI app with CORS (also used as uvicorn factory by workers)."""
+    if WARMUP:
+        _start_render_processes()
+    app = mcp.streamable_http_app()
+    session_lifespan = app.router.lifespan_context
+
+    @asynccontextmanager
+    async def lifespan(app):
+        # uvicorn re-raises SIGTERM/SIGINT after shutdown, skipping atexit
+        # hooks, so stop render processes here rather than orphaning them
+        try:
+            async with session_lifespan(app):
+                yield
+        finally:
+            _stop_render_processes()
+
+    app.router.lifespan_context = lifespan
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    return app
+
+
 if __name__ == "__main__":
     if "--stdio" in sys.argv:
         # Claude Desktop mode
+        if WARMUP:
+            _start_render_processes()
         mcp.run(transport="stdio")
     else:
         # HTTP mode for basic-host (default) - with CORS
-        app = mcp.streamable_http_app()
-        app.add_middleware(
-            CORSMiddleware,
-            allow_origins=["*"],
-            allow_methods=["*"],
-            allow_headers=["*"],
-        )
-        print(f"QR Code Server listening on http://{HOST}:{PORT}/mcp")
-        uvicorn.run(app, host=HOST, port=PORT)
+        # uvicorn[standard] picks uvloop + httptools automatically when available
+        print(f"QR Code Server listening on http://{HOST}:{PORT}/mcp ({WORKERS} workers)")
+        if WORKERS > 1:
+            # Safe since the server is stateless. Workers import the app by name.
+            uvicorn.run(
+                f"{Path(__file__).stem}:create_app",
+                factory=True,
+                app_dir=str(Path(__file__).parent),
+                host=HOST,
+                port=PORT,
+                workers=WORKERS,
+            )
+        else:
+            uvicorn.run(create_app(), host=HOST, port=PORT)
@@ -6,6 +6,8 @@
 #     "uvicorn>=0.34.0",
 #     "starlette>=0.46.0",
 #     "pocket-tts>=1.0.1",
+#     "pybase64>=1.4.0",
+#     "numpy>=1.26.0",
 # ]
 # ///
 """
@@ -33,17 +35,21 @@ Usage:
 """
 from __future__ import annotations
 import asyncio
-import base64
+import json
 import logging
 import os
 import sys
 import time
 import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Annotated, Literal
 from pydantic import Field
 
+import numpy as np
+import pybase64
 import torch
 import uvicorn
 from mcp.server.fastmcp import FastMCP
@@ -59,6 +65,10 @@ logger = logging.getLogger(__name__)
 VIEW_URI = "ui://say-demo/view.html"
 HOST = os.environ.get("HOST", "0.0.0.0")
 PORT = int(os.environ.get("PORT", "3001"))
+# Compile the per-step flow LM and Mimi decoder with torch.compile (slow startup)
+TTS_COMPILE = os.environ.get("TTS_COMPILE") == "1"
+# Weight quantization for the flow LM Linear layers ("int8", CPU only)
+TTS_QUANTIZE = os.environ.get("TTS_QUANTIZE", "")
 
 # Speaker icon as SVG data URI
 SPEAKER_ICON = Icon(
@@ -71,6 +81,14 @@ mcp = FastMCP("Say Demo", icons=[SPEAKER_ICON])
 # Global TTS model (loaded on startup)
 tts_model: TTSModel | None = None
 
+# Generation runs one chunk at a time, so concurrent queues take turns on the
+# model rather than contending for it (other asyncio work carries on meanwhile)
+_tts_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts-gen")
+
+# Reusable host-side int16 buffer for generated audio (pinned when the model
+# is on a GPU); only ever touched from the single _tts_executor thread
+_host_audio_buffer: torch.Tensor | None = None
+
 
 # ------------------------------------------------------
 # TTS Queue State Management
@@ -85,6 +103,13 @@ class AudioChunkData:
     char_end: int
     duration_ms: float
 
+    def to_json(self) -> str:
+        """Serialize the chunk metadata for poll_tts_audio (the audio is sent separately)."""
+        return (
+            f'{{"index": {self.index}, "char_start": {self.char_start}, '
+            f'"char_end": {self.char_end}, "duration_ms": {self.duration_ms}}}'
+        )
+
 
 @dataclass
 class TTSQueueState:
@@ -92,21 +117,25 @@ class TTSQueueState:
     id: str
     voice: str
     sample_rate: int
-    status: Literal["active", "complete", "error"] = "active"
+    status: Literal["active", "complete", "error", "cancelled"] = "active"
     error_message: str | None = None
 
-    # Text queue
-    text_queue: asyncio.Queue = field(default_factory=asyncio.Queue)
+    # Text queue (None marks the end of text), with an event set on append
+    text_deque: deque[str | None] = field(default_factory=deque)
+    text_event: asyncio.Event = field(default_factory=asyncio.Event)
     end_signaled: bool = False
 
     # Audio output
     audio_chunks: list[AudioChunkData] = field(default_factory=list)
-    chunks_delivered: int = 0
+    # Chunks not yet returned by poll_tts_audio
+    pending_chunks: deque[AudioChunkData] = field(default_factory=deque)
+    # Set when a chunk is added or the queue finishes, to wake up long polls
+    chunk_ready: asyncio.Event = field(default_factory=asyncio.Event)
 
     # Tracking
     created_at: float = field(default_factory=time.time)
     last_activity: float = field(default_factory=time.time)  # Last text or end signal
-    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    completed_at: float | None = None  # When a poll first reported done
     task: asyncio.Task | None = None
 
 
@@ -116,6 +145,21 @@ tts_queues: dict[str, TTSQueueState] = {}
 # Queue timeout: if no activity for this long, mark as error
 QUEUE_TIMEOUT_SECONDS = 30
 
+# Finished queues are dropped this long after their last chunk was delivered,
+# by a single reaper task that wakes up every QUEUE_REAP_INTERVAL_SECONDS
+QUEUE_RETENTION_SECONDS = 60
+QUEUE_REAP_INTERVAL_SECONDS = 30
+
+_reaper_task: asyncio.Task | None = None
+
+# Constant tool responses, built once (add_tts_text is called for every
+# streamed piece of text)
+QUEUED = [types.TextContent(type="text", text='{"queued": true}')]
+QUEUE_NOT_FOUND = [types.TextContent(type="text", text='{"error": "Queue not found"}')]
+
+# How long poll_tts_audio waits for a new chunk before returning empty-handed
+POLL_WAIT_SECONDS = 0.5
+
 
 # ------------------------------------------------------
 # Public Tool: say
@@ -146,7 +190,6 @@ def list_voices() -> list[types.TextContent]:
     Returns the predefined voice names that can be used with the say tool.
     You can also use HuggingFace URLs (hf://kyutai/tts-voices/...) or local file paths.
     """
-    import json
     voice_info = {
         "predefined_voices": list(PREDEFINED_VOICES.keys()),
         "default_voice": DEFAULT_VOICE,
@@ -234,13 +277,14 @@ async def create_tts_queue(voice: str = "cosette") -> list[types.TextContent]:
 
     # Start background TTS processing task
     state.task = asyncio.create_task(_run_tts_queue(state))
+    _ensure_reaper()
 
     logger.info(f"Created TTS queue {queue_id}")
 
-    import json
+    # Both values are generated ASCII (hex ID, int), so no JSON escaping needed
     return [types.TextContent(
         type="text",
-        text=json.dumps({"queue_id": queue_id, "sample_rate": sample_rate})
+        text=f'{{"queue_id": "{queue_id}", "sample_rate": {sample_rate}}}'
     )]
 
 
@@ -254,18 +298,16 @@ def add_tts_text(queue_id: str, text: str) -> list[types.TextContent]:
     """
     state = tts_queues.get(queue_id)
     if not state:
-        return [types.TextContent(type="text", text='{"error": "Queue not found"}')]
+        return QUEUE_NOT_FOUND
     if state.end_signaled:
         return [types.TextContent(type="text", text='{"error": "Queue already ended"}')]
 
     # Queue the text (non-blocking)
-    try:
-        state.text_queue.put_nowait(text)
-        state.last_activity = time.time()  # Update activity timestamp
-    except asyncio.QueueFull:
-        return [types.TextContent(type="text", text='{"error": "Queue full"}')]
+    state.text_deque.append(text)
+    state.text_event.set()
+    state.last_activity = time.time()  # Update activity timestamp
 
-    return [types.TextContent(type="text", text='{"queued": true}')]
+    return QUEUED
 
 
 @mcp.tool(meta={"ui":{"visibility":["app"]}})
@@ -278,17 +320,15 @@ def end_tts_queue(queue_id: str) -> list[types.TextContent]:
     state = tts_queues.get(queue_id)
     if not state:
         logger.warning(f"end_tts_queue called for unknown queue: {queue_id}")
-        return [types.TextContent(type="text", text='{"error": "Queue not found"}')]
+        return QUEUE_NOT_FOUND
     if state.end_signaled:
         logger.info(f"end_tts_queue called for already-ended queue: {queue_id}")
         return [types.TextContent(type="text", text='{"already_ended": true}')]
 
     state.end_signaled = True
     state.last_activity = time.time()  # Update activity timestamp
-    try:
-        state.text_queue.put_nowait(None)  # EOF marker
-    except asyncio.QueueFull:
-        pass
+    state.text_deque.append(None)  # EOF marker
+    state.text_event.set()
 
     logger.info(f"end_tts_queue called for queue: {queue_id}")
     return [types.TextContent(type="text", text='{"ended": true}')]
@@ -303,7 +343,7 @@ def cancel_tts_queue(queue_id: str) -> list[types.TextContent]:
     """
     state = tts_queues.pop(queue_id, None)
     if not state:
-        return [types.TextContent(type="text", text='{"error": "Queue not found"}')]
+        return QUEUE_NOT_FOUND
 
     # Cancel the background task
     if state.task and not state.task.done():
@@ -312,82 +352,104 @@ def cancel_tts_queue(queue_id: str) -> list[types.TextContent]:
 
     # Signal end to unblock any waiting consumers
     state.end_signaled = True
-    try:
-        state.text_queue.put_nowait(None)
-    except asyncio.QueueFull:
-        pass
+    state.text_deque.append(None)
+    state.text_event.set()
 
-    state.status = "complete"
+    # Any in-flight long poll returns right away, reporting the cancellation
+    # rather than a normal completion
+    state.status = "cancelled"
+    state.chunk_ready.set()
 
     return [types.TextContent(type="text", text='{"cancelled": true}')]
 
 
-@mcp.tool(meta={"ui":{"visibility":["app"]}})
-def poll_tts_audio(queue_id: str) -> list[types.TextContent]:
+# structured_output=False: otherwise FastMCP also echoes the whole content list
+# (audio included) in structuredContent, doubling every response
+@mcp.tool(meta={"ui":{"visibility":["app"]}}, structured_output=False)
+async def poll_tts_audio(queue_id: str) -> list[types.TextContent | types.AudioContent]:
     """Poll for available audio chunks from a TTS queue.
 
-    Returns base64-encoded audio chunks with timing metadata.
+    Returns timing metadata as JSON text, followed by one audio content item
+    (base64 16-bit PCM) per chunk, in the same order.
+    Waits briefly for a chunk if none is ready yet (long poll).
     Call repeatedly until done=true.
 
     Args:
         queue_id: The queue ID from create_tts_queue
     """
-    import json
-    import time
-
     state = tts_queues.get(queue_id)
     if not state:
-        return [types.TextContent(type="text", text='{"error": "Queue not found"}')]
+        return QUEUE_NOT_FOUND
 
     # Update last activity to prevent timeout during active polling
     state.last_activity = time.time()
 
-    # Get new chunks (use sync approach since we can't await in tool)
-    # The lock is async, so we need to be careful here
-    # For simplicity, just grab what's available without locking
-    new_chunks = state.audio_chunks[state.chunks_delivered:]
-    state.chunks_delivered = len(state.audio_chunks)
-
-    # Consider queues with errors as "done" so view stops polling
-    done = (state.status == "complete" or state.status == "error") and state.chunks_delivered >= len(state.audio_chunks)
-
-    response = {
-        "chunks": [
-            {
-                "index": c.index,
-                "audio_base64": c.audio_base64,
-                "char_start": c.char_start,
-                "char_end": c.char_end,
-                "duration_ms": c.duration_ms,
-            }
-            for c in new_chunks
-        ],
-        "done": done,
-        "status": state.status,
-    }
+    # Long poll: rather than have the view re-poll right away, wait for the
+    # next chunk (or the end of the queue) if nothing new is ready
+    if not state.pending_chunks and state.status == "active":
+        state.chunk_ready.clear()
+        try:
+            await asyncio.wait_for(state.chunk_ready.wait(), timeout=POLL_WAIT_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+    # Drain what's available without locking: nothing else runs on the event
+    # loop until the next await
+    chunks = list(state.pending_chunks)
+    state.pending_chunks.clear()
+    chunks_json = ", ".join([c.to_json() for c in chunks])
+
+    # Consider queues with errors (or cancelled) as "done" so view stops polling
+    # (everything pending was just drained, so no chunk is left behind)
+    done = state.status != "active"
+
+    # Build the JSON directly: the chunk metadata is all numbers
+    response = (
+        f'{{"chunks": [{chunks_json}], "done": {"true" if done else "false"}, '
+        f'"status": "{state.status}"'
+    )
 
     # Include error message if present
     if state.error_message:
-        response["error"] = state.error_message
-
-    # Clean up completed or errored queues
-    if done:
-        # Schedule cleanup after a delay
-        async def cleanup():
-            await asyncio.sleep(60)
-            tts_queues.pop(queue_id, None)
-        try:
-            asyncio.get_event_loop().create_task(cleanup())
-        except RuntimeError:
-            pass
+        response += f', "error": {json.dumps(state.error_message)}'
+    response += "}"
+
+    # Completed or errored queues get cleaned up by the reaper
+    if done and state.completed_at is None:
+        state.completed_at = time.time()
 
-    return [types.TextContent(type="text", text=json.dumps(response))]
+    # Audio goes in its own content items rather than inside the JSON, so the
+    # view doesn't have to JSON-parse megabytes of base64 on top of the transport
+    return [types.TextContent(type="text", text=response)] + [
+        types.AudioContent(type="audio", data=c.audio_base64, mimeType="audio/pcm")
+        for c in chunks
+    ]
 
 
 # ------------------------------------------------------
 # Background TTS Processing
 # ------------------------------------------------------
 
+async def _reap_tts_queues():
+    """Background task: periodically drop queues whose audio was all delivered."""
+    while True:
+        await asyncio.sleep(QUEUE_REAP_INTERVAL_SECONDS)
+        now = time.time()
+        for queue_id, state in list(tts_queues.items()):
+            if state.completed_at is not None and now - state.completed_at > QUEUE_RETENTION_SECONDS:
+                tts_queues.pop(queue_id, None)
+
+
+def _ensure_reaper():
+    """Start the queue reaper on first use (it needs a running event loop)."""
+    global _reaper_task
+    if _reaper_task is None or _reaper_task.done():
+        _reaper_task = asyncio.create_task(_reap_tts_queues())
+
+
+# Token count above which sentence boundaries are found with NumPy
+VECTORIZED_SPLIT_MIN_TOKENS = 1024
+
 
 class StreamingTextChunker:
     """Buffers streaming text and emits chunks when ready for TTS processing.
@@ -412,9 +474,15 @@ class StreamingTextChunker:
         self.min_tokens = min_tokens
         self.buffer = ""
 
+        # Tokens of the last text tokenized, so an unchanged buffer isn't
+        # retokenized (e.g. flush() or buffered_token_count after add_text())
+        self._tok_cache_text = ""
+        self._tok_cache: list[int] = []
+
         # Cache end-of-sentence token IDs for boundary detection
         _, *eos_tokens = tokenizer(".!...?").tokens[0].tolist()
-        self.eos_tokens = set(eos_tokens)
+        self.eos_tokens = frozenset(eos_tokens)
+        self._eos_array = np.array(sorted(self.eos_tokens), dtype=np.int64)
 
     def add_text(self, text: str) -> list[str]:
         """Add text to buffer, return any complete chunks ready for processing.
@@ -464,7 +532,16 @@ class StreamingTextChunker:
         if not text:
             return None
 
-        tokens = self.tokenizer(text).tokens[0].tolist()
+        # Every token covers at least one UTF-8 byte, apart from a possible
+        # leading "▁" piece, so short buffers can't reach min_tokens yet
+        if (
+            not force_emit
+            and len(text) < self.min_tokens - 1
+            and len(text.encode()) < self.min_tokens - 1
+        ):
+            return None
+
+        tokens = self._tokenize(text)
         num_tokens = len(tokens)
 
         # Not enough tokens yet
@@ -491,29 +568,28 @@ class StreamingTextChunker:
                 return chunk
             return None
 
-        # Decode tokens up to split point
+        # Decode tokens up to split point; the rest of the buffer is whatever
+        # follows it in the original text (only decoded if normalization
+        # changed the text so it no longer lines up)
         chunk_text = self.tokenizer.sp.decode(tokens[:split_idx])
-        remaining_text = self.tokenizer.sp.decode(tokens[split_idx:])
+        if text.startswith(chunk_text):
+            remaining_text = text[len(chunk_text):]
+        else:
+            remaining_text = self.tokenizer.sp.decode(tokens[split_idx:])
 
         self.buffer = remaining_text
         return chunk_text.strip()
 
+    def _tokenize(self, text: str) -> list[int]:
+        """Tokenize text, reusing the previous result if the text is unchanged."""
+        if text != self._tok_cache_text:
+            self._tok_cache = self.tokenizer(text).tokens[0].tolist()
+            self._tok_cache_text = text
+        return self._tok_cache
+
     def _find_best_split(self, tokens: list[int], force_emit: bool = False) -> int:
         """Find the best token index to split at (sentence boundary near max_tokens)."""
-        # Find all sentence boundaries (position AFTER the punctuation)
-        boundaries = []
-        prev_was_eos = False
-
-        for i, token in enumerate(tokens):
-            if token in self.eos_tokens:
-                prev_was_eos = True
-            elif prev_was_eos:
-                boundaries.append(i)
-                prev_was_eos = False
-
-        # Also consider end of tokens if it ends with punctuation
-        if tokens and tokens[-1] in self.eos_tokens:
-            boundaries.append(len(tokens))
+        boundaries = self._sentence_boundaries(tokens)
 
         if not boundaries:
             # No sentence boundaries - split at max_tokens if we're over
@@ -536,6 +612,29 @@ class StreamingTextChunker:
 
         return best_boundary
 
+    def _sentence_boundaries(self, tokens: list[int]) -> list[int]:
+        """Find all sentence boundaries (position AFTER the punctuation)."""
+        eos_tokens = self.eos_tokens
+        if len(tokens) >= VECTORIZED_SPLIT_MIN_TOKENS:
+            # Long buffers (e.g. a whole text arriving at once): scan in NumPy,
+            # which only pays off once it amortizes the list conversion
+            is_eos = (np.array(tokens)[:, None] == self._eos_array).any(axis=1)
+            boundaries = (np.flatnonzero(is_eos[:-1] & ~is_eos[1:]) + 1).tolist()
+        else:
+            boundaries = []
+            prev_was_eos = False
+            for i, token in enumerate(tokens):
+                if token in eos_tokens:
+                    prev_was_eos = True
+                elif prev_was_eos:
+                    boundaries.append(i)
+                    prev_was_eos = False
+
+        # Also consider end of tokens if it ends with punctuation
+        if tokens and tokens[-1] in eos_tokens:
+            boundaries.append(len(tokens))
+        return boundaries
+
     def _ends_with_sentence_boundary(self, tokens: list[int]) -> bool:
         """Check if token sequence ends with sentence-ending punctuation."""
         if not tokens:
@@ -550,9 +649,10 @@ class StreamingTextChunker:
     @property
     def buffered_token_count(self) -> int:
         """Approximate token count in buffer."""
-        if not self.buffer.strip():
+        text = self.buffer.strip()
+        if not text:
             return 0
-        return len(self.tokenizer(self.buffer).tokens[0].tolist())
+        return len(self._tokenize(text))
 
 
 async def _run_tts_queue(state: TTSQueueState):
@@ -569,22 +669,26 @@ async def _run_tts_queue(state: TTSQueueState):
 
     try:
         while True:
-            # Wait for text with timeout to detect stale queues
-            try:
-                text_item = await asyncio.wait_for(
-                    state.text_queue.get(),
-                    timeout=5.0  # Check every 5 seconds
-                )
-            except asyncio.TimeoutError:
-                # Check if queue is stale (no activity for too long)
-                if time.time() - state.last_activity > QUEUE_TIMEOUT_SECONDS:
-                    logger.warning(f"TTS queue {state.id} timeout after {QUEUE_TIMEOUT_SECONDS}s of inactivity")
-                    state.status = "error"
-                    state.error_message = f"Queue timeout: no activity for {QUEUE_TIMEOUT_SECONDS}s"
-                    break
-                # Continue waiting - queue might still be active
+            if not state.text_deque:
+                # Wait for text with timeout to detect stale queues
+                state.text_event.clear()
+                try:
+                    await asyncio.wait_for(
+                        state.text_event.wait(),
+                        timeout=5.0  # Check every 5 seconds
+                    )
+                except asyncio.TimeoutError:
+                    # Check if queue is stale (no activity for too long)
+                    if time.time() - state.last_activity > QUEUE_TIMEOUT_SECONDS:
+                        logger.warning(f"TTS queue {state.id} timeout after {QUEUE_TIMEOUT_SECONDS}s of inactivity")
+                        state.status = "error"
+                        state.error_message = f"Queue timeout: no activity for {QUEUE_TIMEOUT_SECONDS}s"
+                        break
+                    # Continue waiting - queue might still be active
                 continue
 
+            text_item = state.text_deque.popleft()
+
             if text_item is None:
                 # EOF - flush remaining text
                 remaining = chunker.flush()
@@ -597,8 +701,12 @@ async def _run_tts_queue(state: TTSQueueState):
                 logger.info(f"TTS queue {state.id} complete: {chunk_index} chunks")
                 break
 
-            # Feed text to chunker
-            ready_chunks = chunker.add_text(text_item)
+            # Feed all text queued so far to the chunker in one go (pieces pile
+            # up while a chunk is being generated), leaving any EOF marker queued
+            pieces = [text_item]
+            while state.text_deque and state.text_deque[0] is not None:
+                pieces.append(state.text_deque.popleft())
+            ready_chunks = chunker.add_text("".join(pieces))
 
             for chunk_text in ready_chunks:
                 await _process_tts_chunk(state, chunk_text, chunk_index, char_offset, model_state)
@@ -609,6 +717,19 @@ async def _run_tts_queue(state: TTSQueueState):
         logger.error(f"TTS queue {state.id} error: {e}")
         state.status = "error"
         state.error_message = str(e)
+    finally:
+        # Wake up any long poll so it reports the final status right away
+        state.chunk_ready.set()
+
+
+def _get_host_audio_buffer(numel: int, pin_memory: bool) -> torch.Tensor:
+    """Get an int16 host buffer view of numel samples, growing it as needed."""
+    global _host_audio_buffer
+    buffer = _host_audio_buffer
+    if buffer is None or buffer.numel() < numel or buffer.is_pinned() != pin_memory:
+        buffer = torch.empty(numel, dtype=torch.int16, pin_memory=pin_memory)
+        _host_audio_buffer = buffer
+    return buffer[:numel]
 
 
 async def _process_tts_chunk(
@@ -622,40 +743,47 @@ async def _process_tts_chunk(
     if tts_model is None:
         return
 
-    loop = asyncio.get_event_loop()
-    audio_bytes_list: list[bytes] = []
-    total_samples = 0
+    loop = asyncio.get_running_loop()
+    # Cheap text prep stays on the event loop, off the generation thread
+    _, frames_after_eos = prepare_text_prompt(text)
+    frames_after_eos += 2
 
-    def generate_sync():
-        nonlocal total_samples
-        _, frames_after_eos = prepare_text_prompt(text)
-        frames_after_eos += 2
-
-        for audio_chunk in tts_model._generate_audio_stream_short_text(
+    def generate_sync() -> tuple[bytes, int]:
+        # Keep frames on the device and convert them in one go, rather than
+        # doing a device->host copy per frame
+        frames = list(tts_model._generate_audio_stream_short_text(
             model_state=model_state,
             text_to_generate=text,
             frames_after_eos=frames_after_eos,
             copy_state=True,
-        ):
-            audio_int16 = (audio_chunk * 32767).to(torch.int16)
-            audio_bytes_list.append(audio_int16.cpu().numpy().tobytes())
-            total_samples += len(audio_chunk)
-
-    await loop.run_in_executor(None, generate_sync)
-
-    combined_audio = b"".join(audio_bytes_list)
+        ))
+        if not frames:
+            return b"", 0
+        # Scale and clamp in place on the fresh concatenated tensor, so
+        # out-of-range samples saturate instead of wrapping around (clicks)
+        audio = torch.cat(frames)
+        audio.mul_(32767.0).clamp_(-32768.0, 32767.0)
+        # Cast and copy to the host in one go, into a reused buffer
+        audio_int16 = _get_host_audio_buffer(audio.numel(), pin_memory=audio.is_cuda)
+        audio_int16.copy_(audio)
+        return audio_int16.numpy().tobytes(), audio.numel()
+
+    combined_audio, total_samples = await loop.run_in_executor(_tts_executor, generate_sync)
     duration_ms = (total_samples / state.sample_rate) * 1000
 
     chunk_data = AudioChunkData(
         index=chunk_index,
-        audio_base64=base64.b64encode(combined_audio).decode(),
+        audio_base64=pybase64.b64encode_as_string(combined_audio),
         char_start=char_offset,
         char_end=char_offset + len(text),
         duration_ms=duration_ms,
     )
 
-    async with state.lock:
-        state.audio_chunks.append(chunk_data)
+    # No lock needed: this queue's background task is the only writer, and
+    # readers only run between awaits on the same event loop
+    state.audio_chunks.append(chunk_data)
+    state.pending_chunks.append(chunk_data)
+    state.chunk_ready.set()
 
     logger.debug(f"TTS queue {state.id}: chunk {chunk_index} ready ({duration_ms:.0f}ms)")
 
@@ -793,11 +921,200 @@ EMBEDDED_VIEW_HTML = """<!DOCTYPE html>
     import { useApp } from '@modelcontextprotocol/ext-apps/react';
     import { applyDocumentTheme, applyHostStyleVariables, applyHostFonts } from '@modelcontextprotocol/ext-apps';
 
+    // Scratch buffer for decoding base64 PCM, reused across chunks (grown as needed)
+    let pcmBytes = new Uint8Array(64 * 1024);
+
+    // Number of int16 samples in base64-encoded PCM, without decoding it
+    function pcm16SampleCount(base64) {
+      const padding = base64.endsWith("==") ? 2 : base64.endsWith("=") ? 1 : 0;
+      return (((base64.length * 3) >> 2) - padding) >> 1;
+    }
+
+    // Decodes base64 int16 PCM into the scratch buffer. The returned view is only
+    // valid until the next call, so copy out of it right away.
+    function decodePcm16(base64) {
+      const binaryString = atob(base64);
+      const n = binaryString.length;
+      if (pcmBytes.length < n) pcmBytes = new Uint8Array(Math.max(n, pcmBytes.length * 2));
+      for (let i = 0; i < n; i++) pcmBytes[i] = binaryString.charCodeAt(i);
+      return new Int16Array(pcmBytes.buffer, 0, n >> 1);
+    }
+
+    // Decodes consecutive base64 int16 PCM chunks into one Float32Array
+    function decodePcm16Batch(base64s) {
+      let total = 0;
+      for (const base64 of base64s) total += pcm16SampleCount(base64);
+      const samples = new Float32Array(total);
+      const scale = 1 / 32768; // Exact (a power of two), so same result as dividing
+      let offset = 0;
+      for (const base64 of base64s) {
+        const int16Array = decodePcm16(base64);
+        const n = int16Array.length;
+        const out = samples.subarray(offset, offset + n);
+        let i = 0;
+        for (; i + 3 < n; i += 4) {
+          out[i] = int16Array[i] * scale;
+          out[i + 1] = int16Array[i + 1] * scale;
+          out[i + 2] = int16Array[i + 2] * scale;
+          out[i + 3] = int16Array[i + 3] * scale;
+        }
+        for (; i < n; i++) out[i] = int16Array[i] * scale;
+        offset += n;
+      }
+      return samples;
+    }
+
+    // Worker running the same decode functions, so long batches don't hold up the
+    // main thread; the samples come back as a transferred buffer (no copy)
+    const PCM_DECODE_WORKER = [
+      "let pcmBytes = new Uint8Array(64 * 1024);",
+      pcm16SampleCount, decodePcm16, decodePcm16Batch,
+      "onmessage = ({ data }) => {" +
+      "  const samples = decodePcm16Batch(data.base64s);" +
+      "  postMessage({ id: data.id, samples }, [samples.buffer]);" +
+      "};",
+    ].join("\\n");
+    let pcmDecodeWorker; // undefined until first use, null if workers are unavailable
+    let pcmDecodeSeq = 0;
+    const pcmDecodeWaiters = new Map();
+
+    function startPcmDecodeWorker() {
+      try {
+        const worker = new Worker(URL.createObjectURL(new Blob([PCM_DECODE_WORKER], { type: "text/javascript" })));
+        worker.onmessage = ({ data }) => {
+          pcmDecodeWaiters.get(data.id)?.resolve(data.samples);
+          pcmDecodeWaiters.delete(data.id);
+        };
+        // e.g. the host's CSP rejects blob: workers: decode the backlog here instead
+        worker.onerror = (err) => {
+          console.log('[TTS] PCM decode worker failed, decoding on main thread:', err);
+          pcmDecodeWorker = null;
+          for (const { resolve, base64s } of pcmDecodeWaiters.values()) resolve(decodePcm16Batch(base64s));
+          pcmDecodeWaiters.clear();
+        };
+        return worker;
+      } catch (err) {
+        console.log('[TTS] PCM decode worker unavailable, decoding on main thread:', err);
+        return null;
+      }
+    }
+
+    // Resolves to the decoded batch, in request order
+    function decodePcm16BatchAsync(base64s) {
+      if (pcmDecodeWorker === undefined) pcmDecodeWorker = startPcmDecodeWorker();
+      if (!pcmDecodeWorker) return Promise.resolve(decodePcm16Batch(base64s));
+      const id = ++pcmDecodeSeq;
+      return new Promise((resolve) => {
+        pcmDecodeWaiters.set(id, { resolve, base64s });
+        pcmDecodeWorker.postMessage({ id, base64s });
+      });
+    }
+
+    // Plays every batch of PCM through a single AudioWorkletNode instead of one
+    // AudioBufferSourceNode per batch. Batches are posted with their start time on
+    // the context clock; the processor outputs silence until then (and through
+    // underruns), so audio still lands where the karaoke timings expect it.
+    const TTS_PLAYER_WORKLET = `
+      class TTSPlayer extends AudioWorkletProcessor {
+        constructor() {
+          super();
+          this.queue = [];
+          this.head = null;
+          this.offset = 0;
+          this.port.onmessage = (e) => {
+            if (e.data === "clear") { this.queue = []; this.head = null; }
+            else this.queue.push(e.data);
+          };
+        }
+        process(inputs, outputs) {
+          const out = outputs[0][0];
+          let i = 0;
+          while (i < out.length) {
+            if (!this.head) {
+              if (this.queue.length === 0) break;
+              this.head = this.queue.shift();
+              this.offset = 0;
+            }
+            const { samples, startTime } = this.head;
+            if (this.offset === 0) {
+              const wait = Math.round((startTime - currentTime) * sampleRate) - i;
+              if (wait >= out.length - i) break; // Not due in this render quantum
+              if (wait > 0) i += wait;
+            }
+            const n = Math.min(out.length - i, samples.length - this.offset);
+            out.set(samples.subarray(this.offset, this.offset + n), i);
+            i += n;
+            this.offset += n;
+            if (this.offset >= samples.length) this.head = null;
+          }
+          return true;
+        }
+      }
+      registerProcessor("tts-player", TTSPlayer);
+    `;
+    let playerModuleUrl = null;
+
+    // Whether text continues prev (i.e. is the same streaming session). Partials only
+    // ever extend the text, so a bounded probe of prev's head and tail stands in for
+    // a full startsWith, which would rescan the whole transcript on every token.
+    const SESSION_PROBE_CHARS = 64;
+    function continuesText(text, prev) {
+      if (text.length < prev.length) return false;
+      if (prev.length <= 2 * SESSION_PROBE_CHARS) return text.startsWith(prev);
+      return text.startsWith(prev.slice(0, SESSION_PROBE_CHARS)) &&
+        text.startsWith(prev.slice(-SESSION_PROBE_CHARS), prev.length - SESSION_PROBE_CHARS);
+    }
+
+    // How long streamed text is buffered before it is sent to the TTS queue
+    const TEXT_FLUSH_INTERVAL_MS = 50;
+
+    // Returns the worklet player node for ctx, or null if AudioWorklet isn't
+    // available (or the host's CSP blocks the blob: module) - callers then fall
+    // back to one buffer source per batch
+    async function createWorkletPlayer(ctx) {
+      if (!ctx.audioWorklet) return null;
+      try {
+        playerModuleUrl ??= URL.createObjectURL(new Blob([TTS_PLAYER_WORKLET], { type: "text/javascript" }));
+        await ctx.audioWorklet.addModule(playerModuleUrl);
+        const node = new AudioWorkletNode(ctx, "tts-player", { numberOfInputs: 0, outputChannelCount: [1] });
+        node.connect(ctx.destination);
+        return node;
+      } catch (err) {
+        console.log('[TTS] AudioWorklet player unavailable, using buffer sources:', err);
+        return null;
+      }
+    }
+
+    // Structural equality for small JSON values (host context fields)
+    function jsonEqual(a, b) {
+      if (a === b) return true;
+      if (typeof a !== "object" || typeof b !== "object" || !a || !b) return false;
+      if (Array.isArray(a) !== Array.isArray(b)) return false;
+      const keys = Object.keys(a);
+      if (keys.length !== Object.keys(b).length) return false;
+      return keys.every((k) => jsonEqual(a[k], b[k]));
+    }
+
+    // Karaoke text, memoized so it only re-renders (and re-slices the text) when the
+    // text or position changes, not on every other SayView state update
+    const KaraokeText = React.memo(function KaraokeText({ text, position, onClick }) {
+      return (
+        <div className="textDisplay" onClick={onClick} style={{cursor: "pointer"}}>
+          <span className="spoken">{text.slice(0, position)}</span>
+          <span className="pending">{text.slice(position)}</span>
+        </div>
+      );
+    });
+
     function SayView() {
       const [hostContext, setHostContext] = useState(undefined);
+      const hostContextRef = useRef(undefined); // Latest hostContext, readable outside renders
       const [displayText, setDisplayText] = useState("");
       const [charPosition, setCharPosition] = useState(0);
-      const [status, setStatus] = useState("idle"); // idle | playing | paused | finished
+      const [status, setStatusState] = useState("idle"); // idle | playing | paused | finished
+      // Mirrors status synchronously, for operations that run after waiting on the audio lock
+      const statusRef = useRef("idle");
+      const setStatus = useCallback((next) => { statusRef.current = next; setStatusState(next); }, []);
       const [hasPendingChunks, setHasPendingChunks] = useState(false);
       const [displayMode, setDisplayMode] = useState("inline");
       const [fullscreenAvailable, setFullscreenAvailable] = useState(false);
@@ -809,21 +1126,34 @@ EMBEDDED_VIEW_HTML = """<!DOCTYPE html>
       const speakLockIntervalRef = useRef(null); // Polling interval for speak lock
       const queueIdRef = useRef(null);
       const audioContextRef = useRef(null);
+      const playerNodeRef = useRef(null);
+      const activeSourcesRef = useRef([]); // Buffer sources, when there is no worklet player
       const sampleRateRef = useRef(24000);
       const nextPlayTimeRef = useRef(0);
+      const lastChunkArrivalRef = useRef(0); // performance.now() of the last received chunk
+      const arrivalGapEwmaRef = useRef(0); // EWMA of chunk inter-arrival gaps (ms)
       const playbackStartTimeRef = useRef(0);
       const chunkTimingsRef = useRef([]);
       const pendingChunksRef = useRef([]);
       const allAudioReceivedRef = useRef(false);
-      const isPollingRef = useRef(false);
+      const pollingQueueIdRef = useRef(null); // Queue the running poll loop belongs to
+      // Bumped whenever playback starts over (new session or restart): async work
+      // started for an older session checks it before touching the schedule
+      const playbackSessionRef = useRef(0);
       const lastTextRef = useRef("");
+      const pendingTextRef = useRef(""); // Streamed text not yet sent to add_tts_text
+      const textFlushTimerRef = useRef(null);
+      const textFlushPromiseRef = useRef(Promise.resolve());
       const fullTextRef = useRef("");
       const progressIntervalRef = useRef(null);
+      const pendingCharPositionRef = useRef(0);
+      const charPositionFrameRef = useRef(0); // Pending requestAnimationFrame for charPosition
       const appRef = useRef(null);
       const lastModelContextUpdateRef = useRef(0);
-      const audioOperationInProgressRef = useRef(false);
+      const audioLockRef = useRef(Promise.resolve()); // Tail of the audio operation chain
       const initQueuePromiseRef = useRef(null);
       const pendingModelContextUpdateRef = useRef(null);
+      const lastModelContextKeyRef = useRef(""); // What the last updateModelContext described
 
       // Speak lock: coordinates multiple TTS views so only one plays at a time
       const SPEAK_LOCK_KEY = "mcp-tts-playing";
@@ -905,56 +1235,104 @@ EMBEDDED_VIEW_HTML = """<!DOCTYPE html>
         return roundToWordEnd(rawPos);
       }, [roundToWordEnd]);
 
+      // Progress ticks only record the latest position, and React state is updated at
+      // most once per animation frame (none at all while the view isn't visible)
+      const queueCharPosition = useCallback((pos) => {
+        pendingCharPositionRef.current = pos;
+        if (charPositionFrameRef.current) return;
+        charPositionFrameRef.current = requestAnimationFrame(() => {
+          charPositionFrameRef.current = 0;
+          setCharPosition(pendingCharPositionRef.current);
+        });
+      }, []);
+
+      // For resets/final positions: apply now, dropping any queued progress update
+      const setCharPositionNow = useCallback((pos) => {
+        if (charPositionFrameRef.current) {
+          cancelAnimationFrame(charPositionFrameRef.current);
+          charPositionFrameRef.current = 0;
+        }
+        setCharPosition(pos);
+      }, []);
+
       const finishPlayback = useCallback(() => {
         setStatus("finished");
         if (progressIntervalRef.current) {
           clearInterval(progressIntervalRef.current);
           progressIntervalRef.current = null;
         }
-        setCharPosition(lastTextRef.current.length);
-      }, []);
+        setCharPositionNow(lastTextRef.current.length);
+      }, [setCharPositionNow]);
 
       const startProgressTracking = useCallback(() => {
         if (progressIntervalRef.current) return;
         progressIntervalRef.current = setInterval(() => {
           const ctx = audioContextRef.current;
           if (!ctx) return;
-          setCharPosition(getCharacterPosition(ctx.currentTime));
+          queueCharPosition(getCharacterPosition(ctx.currentTime));
           if (allAudioReceivedRef.current && ctx.currentTime >= nextPlayTimeRef.current - 0.05) {
             finishPlayback();
           }
         }, 50);
-      }, [getCharacterPosition, finishPlayback]);
-
-      const scheduleAudioChunkInternal = useCallback(async (chunk) => {
+      }, [getCharacterPosition, finishPlayback, queueCharPosition]);
+
+      // Schedules contiguous chunks as ONE batch, posted to the worklet player (or,
+      // without one, as one AudioBuffer / source node): no seams between chunks
+      // Synchronous on purpose: nothing may yield between reading currentTime
+      // and handing the batch to the player, or its start time can slip into the past.
+      // samples is the batch as decoded by decodePcm16Batch(Async);
+      // startAt pins the batch to an absolute context time.
+      const scheduleAudioChunksInternal = useCallback((chunks, samples, startAt) => {
         const ctx = audioContextRef.current;
-        if (!ctx) return;
-        const binaryString = atob(chunk.audio_base64);
-        const bytes = new Uint8Array(binaryString.length);
-        for (let i = 0; i < binaryString.length; i++) bytes[i] = binaryString.charCodeAt(i);
-        const int16Array = new Int16Array(bytes.buffer);
-        const float32Array = new Float32Array(int16Array.length);
-        for (let i = 0; i < int16Array.length; i++) float32Array[i] = int16Array[i] / 32768;
-        const audioBuffer = ctx.createBuffer(1, float32Array.length, sampleRateRef.current);
-        audioBuffer.getChannelData(0).set(float32Array);
-        const source = ctx.createBufferSource();
-        source.buffer = audioBuffer;
-        source.connect(ctx.destination);
-        const startTime = Math.max(ctx.currentTime, nextPlayTimeRef.current);
-        const duration = audioBuffer.duration;
+        if (!ctx || chunks.length === 0) return;
+        const sampleCounts = chunks.map((chunk) => pcm16SampleCount(chunk.audio_base64));
+        const totalLength = samples.length;
+        if (totalLength === 0) return;
+        const sampleRate = sampleRateRef.current;
+        const player = playerNodeRef.current;
+        // Never start within a render quantum of "now": a start time that has
+        // already slipped into the past gets rendered late and leaves a gap
+        const earliest = ctx.currentTime + 128 / ctx.sampleRate;
+        let startTime = Math.max(earliest, nextPlayTimeRef.current);
+        if (startAt !== undefined) {
+          startTime = Math.max(earliest, startAt);
+        } else if (nextPlayTimeRef.current === 0) {
+          // First chunk: pre-buffer in proportion to how irregularly chunks have
+          // been arriving, so later chunks are ready before their turn
+          startTime = ctx.currentTime + Math.min(0.4, Math.max(0.08, 2 * arrivalGapEwmaRef.current / 1000));
+        }
+        const duration = totalLength / sampleRate;
         if (chunkTimingsRef.current.length === 0) {
           playbackStartTimeRef.current = startTime;
           setStatus("playing");
           startProgressTracking();
         }
-        source.start(startTime);
         nextPlayTimeRef.current = startTime + duration;
-        chunkTimingsRef.current.push({
-          charStart: chunk.char_start, charEnd: chunk.char_end,
-          audioStartTime: startTime, audioEndTime: nextPlayTimeRef.current,
+        // Keep per-chunk timings within the merged buffer for text highlighting
+        let chunkStartTime = startTime;
+        chunks.forEach((chunk, i) => {
+          const chunkEndTime = chunkStartTime + sampleCounts[i] / sampleRate;
+          chunkTimingsRef.current.push({
+            charStart: chunk.char_start, charEnd: chunk.char_end,
+            audioStartTime: chunkStartTime, audioEndTime: chunkEndTime,
+          });
+          chunkStartTime = chunkEndTime;
         });
+        if (player) {
+          // Ownership of the samples moves to the audio thread: no copy
+          player.port.postMessage({ samples, startTime }, [samples.buffer]);
+          return;
+        }
+        const audioBuffer = ctx.createBuffer(1, totalLength, sampleRate);
+        audioBuffer.copyToChannel(samples, 0);
+        const source = ctx.createBufferSource();
+        source.buffer = audioBuffer;
+        source.connect(ctx.destination);
+        source.start(startTime);
+        activeSourcesRef.current.push(source);
         const thisBufferEndTime = nextPlayTimeRef.current;
         source.onended = () => {
+          activeSourcesRef.current = activeSourcesRef.current.filter((s) => s !== source);
           if (!audioContextRef.current) return;
           const ct = audioContextRef.current.currentTime;
           if (allAudioReceivedRef.current && thisBufferEndTime >= nextPlayTimeRef.current - 0.01 && ct >= nextPlayTimeRef.current - 0.05) {
@@ -963,54 +1341,64 @@ EMBEDDED_VIEW_HTML = """<!DOCTYPE html>
         };
       }, [startProgressTracking, finishPlayback]);
 
-      const scheduleAudioChunk = useCallback(async (chunk) => {
+      const scheduleAudioChunks = useCallback(async (chunks) => {
         const ctx = audioContextRef.current;
         if (!ctx) return;
         // Only defer to pendingChunks if suspended AND playback hasn't started yet
         // (i.e., autoplay is blocked). If we're paused by user (chunkTimings exists),
         // schedule normally - the audio will queue up and play when resumed.
         if (ctx.state === "suspended" && chunkTimingsRef.current.length === 0) {
-          pendingChunksRef.current.push(chunk);
+          pendingChunksRef.current.push(...chunks);
           setHasPendingChunks(true);
           return;
         }
-        await scheduleAudioChunkInternal(chunk);
-      }, [scheduleAudioChunkInternal]);
+        const session = playbackSessionRef.current;
+        const samples = await decodePcm16BatchAsync(chunks.map((chunk) => chunk.audio_base64));
+        // Dropped if playback was restarted while decoding (the context may be reused)
+        if (playbackSessionRef.current === session) scheduleAudioChunksInternal(chunks, samples);
+      }, [scheduleAudioChunksInternal]);
 
       const startPolling = useCallback(async () => {
         const app = appRef.current;
-        if (isPollingRef.current || !app) return;
-        isPollingRef.current = true;
+        // The loop is tied to the queue it starts on: once playback restarts or a new
+        // session begins, an in-flight poll of the old queue must not touch shared state
+        const queueId = queueIdRef.current;
+        if (!app || !queueId || pollingQueueIdRef.current === queueId) return;
+        pollingQueueIdRef.current = queueId;
 
-        let emptyPollCount = 0;
-        while (queueIdRef.current) {
+        while (queueIdRef.current === queueId) {
           try {
-            const result = await app.callServerTool({ name: "poll_tts_audio", arguments: { queue_id: queueIdRef.current } });
+            // poll_tts_audio is a long poll: it holds the call until a chunk is
+            // ready (or a short timeout), so re-poll right away without sleeping
+            const result = await app.callServerTool({ name: "poll_tts_audio", arguments: { queue_id: queueId } });
+            if (queueIdRef.current !== queueId) break;
             const data = JSON.parse(result.content[0].text);
             if (data.error) {
               console.log('[TTS] Queue error:', data.error);
               break;
             }
-            for (const chunk of data.chunks) await scheduleAudioChunk(chunk);
-            if (data.done) { allAudioReceivedRef.current = true; break; }
-
-            // Adaptive backoff: faster when streaming, slower when waiting
-            if (data.chunks.length > 0) {
-              emptyPollCount = 0;  // Reset - we're getting chunks
-              await new Promise(r => setTimeout(r, 20));  // Fast poll during streaming
-            } else {
-              emptyPollCount++;
-              // Exponential backoff for empty polls: 50ms, 100ms, 150ms max
-              const delay = Math.min(50 + (emptyPollCount * 50), 150);
-              await new Promise(r => setTimeout(r, delay));
+            if (data.status === "cancelled") break;
+            // Each chunk's audio follows the metadata as its own content item
+            data.chunks.forEach((chunk, i) => { chunk.audio_base64 = result.content[i + 1].data; });
+            for (const chunk of data.chunks) {
+              const now = performance.now();
+              if (lastChunkArrivalRef.current) {
+                arrivalGapEwmaRef.current = 0.9 * arrivalGapEwmaRef.current + 0.1 * (now - lastChunkArrivalRef.current);
+              }
+              lastChunkArrivalRef.current = now;
+            }
+            if (data.chunks.length > 0) await scheduleAudioChunks(data.chunks);
+            if (data.done) {
+              if (queueIdRef.current === queueId) allAudioReceivedRef.current = true;
+              break;
             }
           } catch (err) {
             console.log('[TTS] Polling error:', err);
             break;
           }
         }
-        isPollingRef.current = false;
-      }, [scheduleAudioChunk]);
+        if (pollingQueueIdRef.current === queueId) pollingQueueIdRef.current = null;
+      }, [scheduleAudioChunks]);
 
       const cancelCurrentQueue = useCallback(async () => {
         const app = appRef.current;
@@ -1038,16 +1426,18 @@ EMBEDDED_VIEW_HTML = """<!DOCTYPE html>
             if (audioContextRef.current) {
               try { await audioContextRef.current.close(); } catch {}
               audioContextRef.current = null;
+              playerNodeRef.current = null;
             }
             if (progressIntervalRef.current) {
               clearInterval(progressIntervalRef.current);
               progressIntervalRef.current = null;
             }
             // Reset state for new session
+            playbackSessionRef.current++;
             chunkTimingsRef.current = [];
             pendingChunksRef.current = [];
             allAudioReceivedRef.current = false;
-            setCharPosition(0);
+            setCharPositionNow(0);
             setStatus("idle");
             // Create new queue
             console.log('[TTS] creating new queue');
@@ -1063,25 +1453,43 @@ EMBEDDED_VIEW_HTML = """<!DOCTYPE html>
             sampleRateRef.current = data.sample_rate || 24000;
             console.log('[TTS] creating new AudioContext');
             audioContextRef.current = new AudioContext({ sampleRate: sampleRateRef.current });
+            playerNodeRef.current = await createWorkletPlayer(audioContextRef.current);
             nextPlayTimeRef.current = 0;
+            lastChunkArrivalRef.current = 0; // Keep the gap EWMA, but not the idle gap between queues
             startPolling();
             return true;
           } catch (err) { console.error('[TTS] initTTSQueue error:', err); return false; }
           finally { initQueuePromiseRef.current = null; }
         })();
         return initQueuePromiseRef.current;
-      }, [startPolling]);
-
-      const sendTextToTTS = useCallback(async (text) => {
+      }, [startPolling, setCharPositionNow]);
+
+      // Sends all text accumulated since the last flush in one add_tts_text call.
+      // Calls are chained so batches (and a following end_tts_queue) arrive in order.
+      const flushPendingText = useCallback(() => {
+        if (textFlushTimerRef.current) { clearTimeout(textFlushTimerRef.current); textFlushTimerRef.current = null; }
+        const text = pendingTextRef.current;
+        const queueId = queueIdRef.current;
         const app = appRef.current;
-        if (!queueIdRef.current || !app) return;
+        pendingTextRef.current = "";
+        if (text && queueId && app) {
+          textFlushPromiseRef.current = textFlushPromiseRef.current.then(() =>
+            app.callServerTool({ name: "add_tts_text", arguments: { queue_id: queueId, text } }).catch(() => {}));
+        }
+        return textFlushPromiseRef.current;
+      }, []);
+
+      // Streaming partials arrive about once per token: buffer their diffs and send
+      // at most one add_tts_text per TEXT_FLUSH_INTERVAL_MS, unless flush is requested
+      const sendTextToTTS = useCallback(async (text, { flush = false } = {}) => {
+        if (!queueIdRef.current || !appRef.current) return;
         if (text.length > lastTextRef.current.length) {
-          const diff = text.slice(lastTextRef.current.length);
+          pendingTextRef.current += text.slice(lastTextRef.current.length);
           lastTextRef.current = text;
-          try { await app.callServerTool({ name: "add_tts_text", arguments: { queue_id: queueIdRef.current, text: diff } }); }
-          catch (err) {}
         }
-      }, []);
+        if (flush) await flushPendingText();
+        else if (!textFlushTimerRef.current) textFlushTimerRef.current = setTimeout(flushPendingText, TEXT_FLUSH_INTERVAL_MS);
+      }, [flushPendingText]);
 
       const ensureAudioContextResumed = useCallback(async () => {
         const ctx = audioContextRef.current;
@@ -1089,31 +1497,50 @@ EMBEDDED_VIEW_HTML = """<!DOCTYPE html>
           await ctx.resume();
           if (pendingChunksRef.current.length > 0) {
             // This is only reached during initial autoplay unblocking (before any audio played).
-            // Reset nextPlayTimeRef to current time so chunks start immediately.
-            nextPlayTimeRef.current = ctx.currentTime;
+            // Anchor everything buffered so far to one base time, right after resume.
             const chunks = pendingChunksRef.current;
             pendingChunksRef.current = [];
             setHasPendingChunks(false);
-            for (const chunk of chunks) await scheduleAudioChunkInternal(chunk);
+            const session = playbackSessionRef.current;
+            const samples = await decodePcm16BatchAsync(chunks.map((chunk) => chunk.audio_base64));
+            if (playbackSessionRef.current !== session) return;
+            scheduleAudioChunksInternal(chunks, samples, ctx.currentTime + 0.02);
           }
         }
-      }, [scheduleAudioChunkInternal]);
+      }, [scheduleAudioChunksInternal]);
+
+      // Drops everything scheduled so far, keeping the AudioContext (and player) alive
+      const stopScheduledAudio = useCallback(() => {
+        playerNodeRef.current?.port.postMessage("clear");
+        for (const source of activeSourcesRef.current) {
+          try { source.stop(); source.disconnect(); } catch {}
+        }
+        activeSourcesRef.current = [];
+      }, []);
 
-      const restartPlayback = useCallback(async () => {
+      // Serializes play/pause/restart: an operation requested while another is in
+      // flight runs once it completes, instead of being dropped
+      const withAudioLock = useCallback((fn) => {
+        const run = audioLockRef.current.then(() => fn());
+        audioLockRef.current = run.catch(() => {});
+        return run;
+      }, []);
+
+      // Must be called with the audio lock held
+      const restartPlaybackLocked = useCallback(async () => {
         console.log('[TTS] restartPlayback called');
-        // Prevent concurrent audio operations
-        if (audioOperationInProgressRef.current) { console.log('[TTS] restartPlayback blocked'); return; }
-        audioOperationInProgressRef.current = true;
+        // First, so nothing still decoding for the old session gets scheduled
+        playbackSessionRef.current++;
         try {
           if (progressIntervalRef.current) { clearInterval(progressIntervalRef.current); progressIntervalRef.current = null; }
           await cancelCurrentQueue();
-          if (audioContextRef.current) { await audioContextRef.current.close(); audioContextRef.current = null; }
+          stopScheduledAudio();
           const textToReplay = fullTextRef.current || lastTextRef.current;
           if (!textToReplay) return;
-          queueIdRef.current = null; lastTextRef.current = ""; isPollingRef.current = false;
+          queueIdRef.current = null; lastTextRef.current = ""; pendingTextRef.current = "";
           nextPlayTimeRef.current = 0; playbackStartTimeRef.current = 0;
           setStatus("idle"); chunkTimingsRef.current = []; allAudioReceivedRef.current = false;
-          setCharPosition(0); pendingChunksRef.current = []; setHasPendingChunks(false);
+          setCharPositionNow(0); pendingChunksRef.current = []; setHasPendingChunks(false);
           setDisplayText(textToReplay);
           const app = appRef.current;
           if (!app) return;
@@ -1122,31 +1549,42 @@ EMBEDDED_VIEW_HTML = """<!DOCTYPE html>
           if (data.error) return;
           queueIdRef.current = data.queue_id;
           sampleRateRef.current = data.sample_rate || 24000;
-          audioContextRef.current = new AudioContext({ sampleRate: sampleRateRef.current });
+          // Reuse the context: creating one reopens the audio device, which is slow
+          // (notably on iOS). Only a sample rate change needs a new one.
+          let ctx = audioContextRef.current;
+          if (ctx && ctx.sampleRate !== sampleRateRef.current) {
+            await ctx.close();
+            ctx = audioContextRef.current = null;
+            playerNodeRef.current = null;
+          }
+          if (!ctx) {
+            ctx = audioContextRef.current = new AudioContext({ sampleRate: sampleRateRef.current });
+            playerNodeRef.current = await createWorkletPlayer(ctx);
+          } else if (ctx.state === "suspended") {
+            await ctx.resume(); // Restarting from pause: the click is the user gesture
+          }
           nextPlayTimeRef.current = 0;
           await app.callServerTool({ name: "add_tts_text", arguments: { queue_id: queueIdRef.current, text: textToReplay } });
           lastTextRef.current = textToReplay;
           await app.callServerTool({ name: "end_tts_queue", arguments: { queue_id: queueIdRef.current } });
           startPolling();
-        } catch (err) {
-        } finally {
-          audioOperationInProgressRef.current = false;
-        }
-      }, [cancelCurrentQueue, startPolling]);
+        } catch (err) {}
+      }, [cancelCurrentQueue, stopScheduledAudio, startPolling, setCharPositionNow]);
 
-      const togglePlayPause = useCallback(async () => {
+      const restartPlayback = useCallback(
+        () => withAudioLock(restartPlaybackLocked), [withAudioLock, restartPlaybackLocked]);
+
+      const togglePlayPause = useCallback(() => withAudioLock(async () => {
+        // Read state only now: an earlier operation may have just changed it
+        const status = statusRef.current;
         console.log('[TTS] togglePlayPause called, status:', status, 'ctx:', audioContextRef.current?.state);
-        // Prevent concurrent audio operations
-        if (audioOperationInProgressRef.current) { console.log('[TTS] blocked by audioOpInProgress'); return; }
         let ctx = audioContextRef.current;
         try {
-          if (status === "finished") { console.log('[TTS] finished, calling restartPlayback'); await restartPlayback(); return; }
-          // If no context yet, wait for init to complete (up to 3s)
+          if (status === "finished") { console.log('[TTS] finished, calling restartPlayback'); await restartPlaybackLocked(); return; }
+          // If no context yet, wait for an in-flight init to complete
           if (!ctx) {
             console.log('[TTS] no ctx, waiting for init');
-            for (let i = 0; i < 30 && !audioContextRef.current; i++) {
-              await new Promise(r => setTimeout(r, 100));
-            }
+            if (initQueuePromiseRef.current) await initQueuePromiseRef.current;
             ctx = audioContextRef.current;
             if (!ctx) { console.log('[TTS] still no ctx, giving up'); return; }
           }
@@ -1157,7 +1595,7 @@ EMBEDDED_VIEW_HTML = """<!DOCTYPE html>
           if (status === "paused") { console.log('[TTS] resuming paused'); await ctx.resume(); setStatus("playing"); }
           else if (status === "playing") { console.log('[TTS] pausing'); await ctx.suspend(); setStatus("paused"); }
         } catch (err) { console.error('[TTS] togglePlayPause error:', err); }
-      }, [status, restartPlayback, ensureAudioContextResumed]);
+      }), [withAudioLock, restartPlaybackLocked, ensureAudioContextResumed]);
 
       const toggleFullscreen = useCallback(async () => {
         const app = appRef.current;
@@ -1187,12 +1625,13 @@ EMBEDDED_VIEW_HTML = """<!DOCTYPE html>
             const newText = params.arguments?.text;
             if (!newText) return;
             // Detect new session: text doesn't continue from where we left off
-            const isNewSession = lastTextRef.current.length > 0 && !newText.startsWith(lastTextRef.current);
+            const isNewSession = lastTextRef.current.length > 0 && !continuesText(newText, lastTextRef.current);
             if (isNewSession) {
               console.log('[TTS] new session detected in partial - resetting queue');
               // Reset for new session
               queueIdRef.current = null;
               lastTextRef.current = "";
+              pendingTextRef.current = "";
             }
             setDisplayText(newText);
             if (!queueIdRef.current && !(await initTTSQueue())) {
@@ -1212,18 +1651,19 @@ EMBEDDED_VIEW_HTML = """<!DOCTYPE html>
             const shouldAutoPlay = params.arguments?.autoPlay !== false;
             setAutoPlay(shouldAutoPlay);
             // Detect new session: text doesn't continue from where we left off
-            const isNewSession = lastTextRef.current.length > 0 && !text.startsWith(lastTextRef.current);
+            const isNewSession = lastTextRef.current.length > 0 && !continuesText(text, lastTextRef.current);
             if (isNewSession) {
               console.log('[TTS] new session detected in input - resetting queue');
               queueIdRef.current = null;
               lastTextRef.current = "";
+              pendingTextRef.current = "";
             }
             setDisplayText(text);
             if (!queueIdRef.current && !(await initTTSQueue())) {
               console.log('[TTS] initTTSQueue failed in input');
               return;
             }
-            await sendTextToTTS(text);
+            await sendTextToTTS(text, { flush: true });
           };
           app.ontoolresult = async (params) => {
             console.log('[TTS] ontoolresult called, queueId:', queueIdRef.current);
@@ -1236,6 +1676,7 @@ EMBEDDED_VIEW_HTML = """<!DOCTYPE html>
             }
             if (queueIdRef.current) {
               console.log('[TTS] Calling end_tts_queue for:', queueIdRef.current);
+              await flushPendingText();
               try { await app.callServerTool({ name: "end_tts_queue", arguments: { queue_id: queueIdRef.current } }); }
               catch (err) {
                 console.log('[TTS] end_tts_queue error:', err);
@@ -1248,14 +1689,21 @@ EMBEDDED_VIEW_HTML = """<!DOCTYPE html>
           };
           app.onteardown = async () => {
             if (progressIntervalRef.current) clearInterval(progressIntervalRef.current);
+            if (textFlushTimerRef.current) clearTimeout(textFlushTimerRef.current);
+            if (charPositionFrameRef.current) cancelAnimationFrame(charPositionFrameRef.current);
             stopSpeakLockPolling();
             clearSpeakLock();
             await cancelCurrentQueue();
-            if (audioContextRef.current) { await audioContextRef.current.close(); audioContextRef.current = null; }
+            if (audioContextRef.current) { await audioContextRef.current.close(); audioContextRef.current = null; playerNodeRef.current = null; }
             return {};
           };
           app.onhostcontextchanged = (params) => {
-            setHostContext(prev => ({ ...prev, ...params }));
+            // Hosts resend unchanged values (e.g. the same safe-area insets): skip the
+            // re-render and the theme/style re-application when nothing changed
+            const prev = hostContextRef.current;
+            if (prev && Object.keys(params).every((k) => jsonEqual(prev[k], params[k]))) return;
+            hostContextRef.current = { ...prev, ...params };
+            setHostContext(hostContextRef.current);
             // Sync displayMode when host changes it (e.g., user exits fullscreen via host UI)
             if (params.displayMode) {
               setDisplayMode(params.displayMode);
@@ -1277,6 +1725,7 @@ EMBEDDED_VIEW_HTML = """<!DOCTYPE html>
       useEffect(() => {
         if (!app) return;
         const ctx = app.getHostContext();
+        hostContextRef.current = ctx;
         setHostContext(ctx);
         if (ctx?.availableDisplayModes?.includes("fullscreen")) {
           setFullscreenAvailable(true);
@@ -1324,11 +1773,16 @@ EMBEDDED_VIEW_HTML = """<!DOCTYPE html>
         if (!app || !displayText || status === "idle") return;
         const caps = app.getHostCapabilities();
         if (!caps?.updateModelContext) return;
+        // Nothing worth (re)scheduling if the model was already told about this state
+        // (position counted in 10-char steps, as it advances on every progress tick)
+        const key = status + `:` + Math.floor(charPosition / 10) + `:` + displayText.length;
+        if (key === lastModelContextKeyRef.current) return;
         const now = Date.now();
         const timeSince = now - lastModelContextUpdateRef.current;
         const DEBOUNCE_MS = 2000;
         const doUpdate = () => {
           lastModelContextUpdateRef.current = Date.now();
+          lastModelContextKeyRef.current = key;
           pendingModelContextUpdateRef.current = null;
           const snippetStart = Math.max(0, charPosition - 30);
           const snippetEnd = Math.min(displayText.length, charPosition + 10);
@@ -1348,9 +1802,6 @@ EMBEDDED_VIEW_HTML = """<!DOCTYPE html>
       if (error) return <div><strong>ERROR:</strong> {error.message}</div>;
       if (!app) return <div>Connecting...</div>;
 
-      const spokenText = displayText.slice(0, charPosition);
-      const pendingText = displayText.slice(charPosition);
-
       return (
         <main
           className={`container` + (displayMode === "fullscreen" ? ` fullscreen` : ``)}
@@ -1368,10 +1819,7 @@ EMBEDDED_VIEW_HTML = """<!DOCTYPE html>
           }}
         >
           <div className="textWrapper">
-            <div className="textDisplay" onClick={togglePlayPause} style={{cursor: "pointer"}}>
-              <span className="spoken">{spokenText}</span>
-              <span className="pending">{pendingText}</span>
-            </div>
+            <KaraokeText text={displayText} position={charPosition} onClick={togglePlayPause} />
           </div>
           {/* Toolbar - top right */}
           <div className="toolbar">
@@ -1421,8 +1869,8 @@ EMBEDDED_VIEW_HTML = """<!DOCTYPE html>
 </html>"""
 
 
-def get_view_html() -> str:
-    """Get the View HTML, preferring built version from dist/."""
+def _read_view_html() -> str:
+    """Read the View HTML, preferring built version from dist/."""
     # Prefer built version from dist/ (local development with npm run build)
     dist_path = Path(__file__).parent / "dist" / "mcp-app.html"
     if dist_path.exists():
@@ -1431,6 +1879,17 @@ def get_view_html() -> str:
     return EMBEDDED_VIEW_HTML
 
 
+# The View is static: read it once at startup rather than on every resource read
+VIEW_HTML = _read_view_html()
+
+
+def get_view_html() -> str:
+    """Get the View HTML (re-read on every call when DEV is set, to pick up rebuilds)."""
+    if os.environ.get("DEV"):
+        return _read_view_html()
+    return VIEW_HTML
+
+
 # IMPORTANT: all the external domains used by app must be listed
 # in the meta.ui.csp.resourceDomains - otherwise they will be blocked by CSP policy
 @mcp.resource(
@@ -1447,11 +1906,67 @@ def view() -> str:
 # Startup
 # ------------------------------------------------------
 
+def _quantize_tts_model(model: TTSModel):
+    """Quantize the flow LM Linear weights to int8 (activations stay in float)."""
+    if TTS_QUANTIZE != "int8":
+        raise ValueError(f"Unsupported TTS_QUANTIZE value: {TTS_QUANTIZE!r} (expected 'int8')")
+    if model.device != "cpu":
+        logger.warning("TTS_QUANTIZE=int8 is only supported on CPU, skipping")
+        return
+    # Attention in_proj weights are read directly when creating KV caches, so
+    # keep them as plain Linear layers. The Mimi decoder is left untouched as
+    # it's smaller and more sensitive to audio quality.
+    linear_names = {
+        name
+        for name, module in model.flow_lm.named_modules()
+        if isinstance(module, torch.nn.Linear) and not name.endswith("in_proj")
+    }
+    model.flow_lm = torch.ao.quantization.quantize_dynamic(
+        model.flow_lm, linear_names, dtype=torch.qint8, inplace=True
+    )
+
+
+def _compile_tts_model(model: TTSModel):
+    """Compile the autoregressive step functions to cut per-step Python overhead."""
+    # CUDA graphs only pay off on GPU; pocket-tts runs on CPU by default
+    mode = "reduce-overhead" if model.device == "cuda" else "default"
+    model.flow_lm.forward = torch.compile(model.flow_lm.forward, mode=mode, fullgraph=False)
+    model.mimi.decode_from_latent = torch.compile(
+        model.mimi.decode_from_latent, mode=mode, fullgraph=False
+    )
+
+
+def _warmup_tts_model(model: TTSModel):
+    """Run a throwaway generation so the first request doesn't pay compile costs."""
+    model_state = model._cached_get_state_for_audio_prompt(DEFAULT_VOICE, truncate=True)
+    text = "Hello there."
+    _, frames_after_eos = prepare_text_prompt(text)
+    for _ in model._generate_audio_stream_short_text(
+        model_state=model_state,
+        text_to_generate=text,
+        frames_after_eos=frames_after_eos,
+        copy_state=True,
+    ):
+        pass
+
+
 def load_tts_model():
     """Load the TTS model on startup."""
     global tts_model
     logger.info("Loading TTS model...")
-    tts_model = TTSModel.load_model()
+    model = TTSModel.load_model()
+    if model.device == "cuda":
+        # Let float32 matmuls use TF32 tensor cores (pocket-tts hardcodes float32
+        # in places, so the weights themselves can't simply be cast to bf16)
+        torch.set_float32_matmul_precision("high")
+    if TTS_QUANTIZE:
+        logger.info(f"Quantizing TTS model ({TTS_QUANTIZE})...")
+        _quantize_tts_model(model)
+    if TTS_COMPILE:
+        logger.info("Compiling TTS model (this can take a while)...")
+        _compile_tts_model(model)
+        _warmup_tts_model(model)
+    tts_model = model
     logger.info("TTS model loaded")
 
 